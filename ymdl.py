@@ -27,6 +27,7 @@ import argparse
 import logging
 
 import os
+import sys
 
 import urllib.request
 import urllib.parse
@@ -35,6 +36,9 @@ import json
 from hashlib import md5
 import mimetypes
 import itertools
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from mutagen import id3, mp3
 
@@ -117,6 +121,13 @@ COVER_SIZES = [
     ]
 
 
+def positive_int(s):
+    n = int(s)
+    if n < 1:
+        raise argparse.ArgumentTypeError('must be a positive integer')
+    return n
+
+
 parser = argparse.ArgumentParser(
     description='Yandex.Music downloader',
     usage='%(prog)s [OPTIONS] URL [URL..]',
@@ -170,6 +181,14 @@ parser.add_argument(
 parser.add_argument(
     '--m3u', action='store_true',
     help='Create m3u8 playlist.')
+parser.add_argument(
+    '--plan', metavar='FILE',
+    help=('Don\'t download anything, only write JSON plan of the jobs '
+          '(tracks, paths, sizes, duplicates) to FILE (or "-" for stdout).'))
+parser.add_argument(
+    '-j', '--jobs', metavar='N', type=positive_int, default=8,
+    help=('Number of parallel URLs and info requests in --plan mode '
+          '(default = 8). Has no effect without --plan.'))
 
 args = parser.parse_args()
 
@@ -314,6 +333,9 @@ class AlbumCover:
         for n in COVER_SIZES:
             if size <= n:
                 break
+        if args.plan:
+            count_plan_request('cover')
+            return PlannedCover()
         try:
             return cls('https://' + uri.replace('%%', '{0}x{0}'.format(n)))
         except URLError as e:
@@ -329,19 +351,48 @@ class AlbumCover:
             logging.error('Can\'t save cover: %s', e)
 
 
-def _info_js(template):
+class PlannedCover:
+    '''Cover which is only counted, not downloaded, in --plan mode.'''
+    def save(self, path):
+        pass
+
+
+def _info_js(template, counted=True):
     def info_loader(**kwargs):
+        if counted and args.plan:
+            count_plan_request('info')
         with urllib.request.urlopen(template.format(**kwargs), timeout=6) as r:
             return json.loads(r.read().decode())
     return info_loader
 
-track_src_info = _info_js(YM_TRACK_SRC_INFO)
+# download-info requests are estimated per track in the plan.
+track_src_info = _info_js(YM_TRACK_SRC_INFO, counted=False)
 track_info = _info_js(YM_TRACK_INFO)
 album_info = _info_js(YM_ALBUM_INFO)
 artist_info = _info_js(YM_ARTIST_INFO)
 playlist_info = _info_js(YM_PLAYLIST_INFO)
 
 
+# State of --plan mode. Each URL is resolved in its own thread which collects
+# its jobs to _plan_local, info lookups for lists of ids go to _info_executor.
+_plan_local = threading.local()
+_plan_lock = threading.Lock()
+_plan_requests = collections.Counter()
+_info_executor = ThreadPoolExecutor(args.jobs) if args.plan else None
+
+
+def count_plan_request(kind):
+    with _plan_lock:
+        _plan_requests[kind] += 1
+
+
+def map_info(loader, key, ids):
+    '''Load info for each id, in parallel in --plan mode.'''
+    if args.plan:
+        return _info_executor.map(lambda i: loader(**{key: i}), ids)
+    return (loader(**{key: i}) for i in ids)
+
+
 def get_track_url(track):
     info = track_src_info(**track)
     info['path'] = info['path'].lstrip('/')
@@ -430,6 +481,12 @@ def download_track(track, save_path=args.out, name_mask=None, cover_id3=None):
         track_name += '.mp3'
     track_path = os.path.join(save_path, track_name)
 
+    if args.plan:
+        plan_track(track, track_path,
+                   not cover_id3 and 'coverUri' in album and
+                   args.cover_id3_size > 0)
+        return make_extinf(track, track_name)
+
     if not args.quiet:
         print_track_info(track)
 
@@ -453,14 +510,18 @@ def download_track(track, save_path=args.out, name_mask=None, cover_id3=None):
 
 def download_tracks(tracks, save_path, name_mask,
                     cover_id3=None, vol_num=None):
-    os.makedirs(save_path, exist_ok=True)
+    if not args.plan:
+        os.makedirs(save_path, exist_ok=True)
 
     extinfs = []
     ntracks = len(tracks)
+    infos = iter(map_info(
+        track_info, 'track',
+        [t for t in tracks if isinstance(t, (int, str))]))
 
     for n, track in enumerate(tracks, 1):
         if isinstance(track, (int, str)):
-            track = track_info(track=track)['track']
+            track = next(infos)['track']
 
         track[FLD_TRACKNUM] = n
         album = track['albums'][0]
@@ -471,7 +532,7 @@ def download_tracks(tracks, save_path, name_mask,
         extinf = download_track(track, save_path, name_mask, cover_id3)
         extinfs.append(extinf)
 
-    if args.m3u:
+    if args.m3u and not args.plan:
         try:
             save_m3u(extinfs, save_path)
         except OSError as e:
@@ -524,7 +585,7 @@ def download_album(album, save_path=args.out, name_mask=None, num=None):
         cover = None
         cover_id3 = None
 
-    if not args.quiet:
+    if not (args.quiet or args.plan):
         print_album_info(album, num)
 
     if nvolumes == 1:
@@ -542,9 +603,12 @@ def download_album(album, save_path=args.out, name_mask=None, num=None):
 
 def download_albums(albums, save_path=args.out):
     nalbums = len(albums)
+    infos = iter(map_info(
+        album_info, 'album',
+        [a for a in albums if isinstance(a, (int, str))]))
     for n, album in enumerate(albums, 1):
         if isinstance(album, (int, str)):
-            album = album_info(album=album)
+            album = next(infos)
         download_album(
             album, save_path,
             args.album_name or DAN_ARTIST_ALBUMS, (n, nalbums))
@@ -580,6 +644,178 @@ def download_playlist(pls):
     download_tracks(tracks, save_path, args.track_name or DTN_PLAYLIST)
 
 
+def plan_track(track, track_path, cover_request=False):
+    '''Add track to the plan instead of downloading it.'''
+    job = {
+        'track': str(track['id']),
+        'title': track['title'],
+        'artists': track['artists'],
+        'path': track_path,
+        'size': None,
+        'exists': False,
+        'part_size': 0,
+        'cover_request': cover_request,
+        'duplicate_of': None,
+        'same_track_as': None,
+        }
+    file_part = track_path + _DL_PART_EXT
+    try:
+        if os.path.exists(track_path):
+            job['exists'] = True
+            job['size'] = os.path.getsize(track_path)
+        elif os.path.isfile(file_part):
+            job['part_size'] = os.path.getsize(file_part)
+    except OSError as e:
+        logging.error('Can\'t get size of %s: %s', track_path, e)
+    _plan_local.jobs.append((job, track))
+
+
+def get_track_size(track):
+    '''Get size of the track file in bytes without downloading it.'''
+    # track.jsx often reports zero size.
+    size = int(track.get('fileSize') or 0)
+    if size > 0:
+        return size
+    request = urllib.request.Request(get_track_url(track), method='HEAD')
+    with urllib.request.urlopen(request, timeout=6) as r:
+        return int(r.getheader('Content-Length'))
+
+
+def plan_url(url):
+    '''Resolve URL in --plan mode.
+
+    Return tuple (url, list of (job, track) pairs, error message or None).
+    Jobs found before an error are kept.
+    '''
+    _plan_local.jobs = []
+    error = None
+    try:
+        parse_url(url)
+    except YmdlWrongUrlError:
+        error = 'Wrong or unsupported URL: {}'.format(url)
+    except YmdlError as e:
+        error = str(e)
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        # ValueError also covers non-JSON response of info handlers.
+        error = '{}: seems like API was changed ({!r})'.format(url, e)
+    except OSError as e:
+        error = '{}: {}'.format(url, e)
+    if error:
+        logging.error(error)
+    return url, _plan_local.jobs, error
+
+
+def save_plan(path, results):
+    '''Resolve sizes of planned tracks and write the plan as JSON.
+
+    results -- list of plan_url() results
+    '''
+    jobs = []
+    tracks = {}
+    errors = []
+    for url, url_jobs, error in results:
+        for job, track in url_jobs:
+            job['url'] = url
+            jobs.append(job)
+            tracks.setdefault(job['track'], track)
+        if error:
+            errors.append({'url': url, 'error': error})
+
+    # Job with the same path is skipped by the real run, but the same track
+    # at another path is downloaded again.
+    first_path = {}
+    first_track = {}
+    for n, job in enumerate(jobs):
+        if job['path'] in first_path:
+            job['duplicate_of'] = first_path[job['path']]
+            continue
+        first_path[job['path']] = n
+        if job['track'] in first_track:
+            job['same_track_as'] = first_track[job['track']]
+        else:
+            first_track[job['track']] = n
+
+    def resolve(track_id):
+        try:
+            return track_id, get_track_size(tracks[track_id])
+        except (OSError, KeyError, TypeError, ValueError) as e:
+            logging.error('Can\'t get size of track %s: %s', track_id, e)
+            return track_id, None
+
+    need_size = set(
+        j['track'] for j in jobs
+        if not j['exists'] and j['duplicate_of'] is None)
+    sizes = dict(_info_executor.map(resolve, need_size))
+
+    totals = {
+        'tracks': len(jobs),
+        'unique_tracks': len(tracks),
+        'duplicates': 0,
+        'duplicate_content': 0,
+        'existing': 0,
+        'bytes': 0,
+        'track_requests': 0,
+        'info_requests': _plan_requests['info'],
+        'cover_requests': _plan_requests['cover'],
+        }
+    for j in jobs:
+        # Real run requests download-info before it finds out that the file
+        # exists, so skipped tracks cost one request too.
+        if j['duplicate_of'] is not None:
+            j['size'] = jobs[j['duplicate_of']]['size']
+            totals['duplicates'] += 1
+            totals['track_requests'] += 1
+            continue
+        if j['same_track_as'] is not None:
+            totals['duplicate_content'] += 1
+        if j['exists']:
+            totals['existing'] += 1
+            totals['track_requests'] += 1
+            continue
+        j['size'] = sizes.get(j['track'])
+        # download-info + mp3 itself
+        totals['track_requests'] += 2
+        if j['cover_request']:
+            totals['cover_requests'] += 1
+        if j['size'] is not None:
+            totals['bytes'] += j['size'] - j['part_size']
+    totals['requests'] = (totals['track_requests'] +
+                          totals['info_requests'] +
+                          totals['cover_requests'])
+
+    def dump(f):
+        json.dump({'jobs': jobs, 'totals': totals, 'errors': errors}, f,
+                  ensure_ascii=False, indent=2)
+        f.write('\n')
+
+    if path == '-':
+        dump(sys.stdout)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            dump(f)
+
+
+def plan(urls):
+    '''Resolve URLs in parallel and write the plan even if some failed.'''
+    results = []
+    try:
+        with ThreadPoolExecutor(args.jobs) as executor:
+            futures = [(url, executor.submit(plan_url, url)) for url in urls]
+            for url, future in futures:
+                # plan_url handles known errors itself, this is a safety net
+                # so one URL doesn't lose results of the others.
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    logging.exception('%s: unexpected error', url)
+                    results.append((url, [], '{}: {!r}'.format(url, e)))
+    finally:
+        try:
+            save_plan(args.plan, results)
+        finally:
+            _info_executor.shutdown()
+
+
 def parse_url(url):
     url_info = urllib.parse.urlsplit(url)
     if not (url_info.scheme in ('http', 'https') and
@@ -634,6 +870,10 @@ def main():
             parser.error('You must provide at least one URL.')
         urls = args.url
 
+    if args.plan:
+        plan(urls)
+        return
+
     try:
         for url in urls:
             try: